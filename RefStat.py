@@ -1,54 +1,107 @@
+import os
 import streamlit as st
 import pandas as pd
+import numpy as np
+import pyarrow as pa
 from datetime import datetime
 
-# Function to load data from a local file path
-def load_data_from_path(file_path):
-    return pd.read_csv(file_path)
+# Function to load data from a local file path; mtime is part of the cache key
+# so a changed file is reloaded, and only the latest version is kept
+@st.cache_resource(max_entries=1)
+def load_data_from_path(file_path, mtime):
+    # Reuse the Parquet copy of the CSV if it is at least as new as the CSV
+    cache_path = os.path.splitext(file_path)[0] + ".parquet"
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(file_path):
+        try:
+            df = pd.read_parquet(cache_path, engine="pyarrow")
+        except (OSError, pa.ArrowException):
+            df = None  # Unreadable copy; rebuild it from the CSV below
+        if df is not None and df["Date"].is_monotonic_increasing:
+            return df
+
+    # Parse with the Arrow CSV reader; Date is typed during the read
+    df = pd.read_csv(file_path, engine="pyarrow", parse_dates=["Date"])
+
+    # Referees as categories so they can be aggregated by integer code
+    df["Domare"] = df["Domare"].astype("category")
+
+    # Count blank match cells as zero, then store counts in the narrowest unsigned type
+    df["Matcher"] = pd.to_numeric(df["Matcher"].fillna(0).astype(np.int64), downcast="unsigned")
+
+    # Rows without a date can never match a date range; dropping them also keeps
+    # NaT out of the sorted ends used for the date inputs
+    df = df.dropna(subset=["Date"])
+
+    # Keep rows in date order so date ranges can be located by binary search
+    df = df.sort_values("Date", kind="mergesort", ignore_index=True)
+
+    # Write the Parquet copy for the next cold start; not fatal if it fails.
+    # Write to a temporary file first so a crash never leaves a partial copy.
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        df.to_parquet(tmp_path, engine="pyarrow", compression="zstd")
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return df
 
 # Function to filter data by date range
 def filter_data_by_date(df, start_date, end_date):
-    # Convert "Date" to datetime for filtering
-    filtered_df = df.copy()
-    filtered_df["DateTemp"] = pd.to_datetime(filtered_df["Date"])  # Temporary column for filtering
-    start_date = pd.to_datetime(start_date)
-    end_date = pd.to_datetime(end_date)
+    start = np.datetime64(start_date)
+    end = np.datetime64(end_date)
 
-    # Filter rows between the given dates
-    filtered_df = filtered_df[(filtered_df["DateTemp"] >= start_date) & (filtered_df["DateTemp"] <= end_date)]
-    filtered_df.drop(columns=["DateTemp"], inplace=True)  # Drop temporary column
+    # Rows are sorted by date, so the range is a contiguous slice
+    dates = df["Date"].values
+    lo = np.searchsorted(dates, start, side="left")
+    hi = np.searchsorted(dates, end, side="right")
 
-    # Group by referee and sum matches
-    grouped = filtered_df.groupby("Domare")["Matcher"].sum().reset_index()
+    # Only the referee codes and match counts are needed; slice those arrays as views
+    codes = df["Domare"].cat.codes.values[lo:hi]
+    matches = df["Matcher"].values[lo:hi]
+
+    # Sum matches per referee over the category codes (-1 marks a missing referee)
+    referees = df["Domare"].cat.categories
+    known = codes >= 0
+    codes = codes[known]
+    totals = np.bincount(codes, weights=matches[known], minlength=len(referees)).astype(np.int64)
+    present = np.flatnonzero(np.bincount(codes, minlength=len(referees)))
 
     # Sort by matches descending
-    grouped = grouped.sort_values(by="Matcher", ascending=False).reset_index(drop=True)
+    order = present[np.argsort(-totals[present], kind="stable")]
+    grouped = pd.DataFrame({"Domare": referees[order], "Matcher": totals[order]})
+
+    # Arrow-backed columns let st.dataframe hand the buffers over without converting
+    grouped = grouped.convert_dtypes(dtype_backend="pyarrow")
 
     return grouped
 
+# Function to filter data by date range, memoized per loaded file and date range
+@st.cache_data(max_entries=32, show_spinner=False)
+def filter_data_cached(_df, data_id, start_date, end_date):
+    # _df is not hashed; data_id identifies its contents
+    return filter_data_by_date(_df, start_date, end_date)
+
 # Streamlit App
 st.title("RefStat")
 
-# Initialize session state for data
-if "data" not in st.session_state:
-    st.session_state["data"] = None
-
 # File path for the CSV file
 file_path = "vsibf.csv"
 
-# Auto-load data if not already loaded
-if st.session_state["data"] is None:
-    try:
-        data = load_data_from_path(file_path)
-        st.session_state["data"] = data
-    except Exception as e:
-        st.error(f"Failed to auto-load data: {e}")
+# Auto-load data; the read-only frame is loaded once and shared by all sessions
+data = None
+try:
+    data_id = (file_path, os.path.getmtime(file_path))
+    data = load_data_from_path(*data_id)
+except Exception as e:
+    st.error(f"Failed to auto-load data: {e}")
 
 # Display loaded data if available
-if st.session_state["data"] is not None:
-    # Find the min and max dates in the dataset
-    min_date = pd.to_datetime(st.session_state["data"]["Date"]).min()
-    max_date = pd.to_datetime(st.session_state["data"]["Date"]).max()
+if data is not None:
+    # Rows are sorted by date, so the range is the first and last row
+    min_date = data["Date"].iat[0].date()
+    max_date = data["Date"].iat[-1].date()
 
     # Display dropdowns and date inputs
     sport = st.selectbox("Idrott", ["Innebandy"], index=0)
@@ -63,7 +116,7 @@ if st.session_state["data"] is not None:
             st.error("Start date must be before or equal to end date.")
         else:
             # Filter and process the data
-            result = filter_data_by_date(st.session_state["data"], start_date, end_date)
+            result = filter_data_cached(data, data_id, start_date, end_date)
 
             result.index = result.index + 1
 
@@ -72,10 +125,9 @@ if st.session_state["data"] is not None:
             st.dataframe(result)
 
             # Option to download the result as CSV
-            csv = result.to_csv(index=False)
             # st.download_button(
             #     label="Ladda ner som CSV",
-            #     data=csv,
+            #     data=result.to_csv(index=False),
             #     file_name="filtered_referee_statistics.csv",
             #     mime="text/csv",
             # )